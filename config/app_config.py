@@ -0,0 +1,15 @@
+from dotenv import load_dotenv
+
+_initialized = False
+
+
+def initialize_app():
+    """
+    Load environment configuration for the application.
+    Safe to call from every entry point; only the first call has any effect.
+    """
+    global _initialized
+    if _initialized:
+        return
+    load_dotenv()
+    _initialized = True
@@ -1,5 +1,7 @@
+import atexit
 import logging
 import logging.handlers
+import queue
 import sys
 from pathlib import Path
 
@@ -46,9 +48,16 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
 
+    # File writes happen on a background thread; loggers only enqueue records
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, error_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
     # Add handlers to root logger
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(error_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
     root_logger.addHandler(console_handler)
 
     # Configure specific loggers
@@ -1,102 +1,543 @@
+import atexit
+import contextlib
 import docker
-import git
-import json
+import fcntl
+import hashlib
+import orjson
 import os
+import requests
 import shutil
 import tempfile
+import threading
+import time
+import urllib3
 import uuid
 import subprocess
+from typing import Callable, ContextManager, Optional
+from config.app_config import initialize_app
 
 # Use centralized logging
 from logging import getLogger
 
 log = getLogger(__name__)
 
+# The settings below are read at import time, so load .env first
+initialize_app()
+
+# Scanner image to run. Point this at a registry image (e.g. one with a SOCI or
+# eStargz index) so workers can lazily pull it instead of loading it in full.
+SCANNER_IMAGE = os.getenv("SCANNER_IMAGE", "scanner-image:latest")
+
+# Scratch directories for cloned repositories. RAM-backed /dev/shm is preferred
+# so clones never touch the disk; it is shared with the warm scanner containers.
+DISK_JOBS_DIR = os.path.join(tempfile.gettempdir(), "scanner-jobs")
+JOBS_DIR = (
+    os.path.join("/dev/shm", "scanner-jobs")
+    if os.path.isdir("/dev/shm")
+    else DISK_JOBS_DIR
+)
+JOBS_MOUNT = "/jobs"
+# Minimum free space in /dev/shm before a clone is placed there
+SCRATCH_MIN_FREE_BYTES = int(os.getenv("SCANNER_SCRATCH_MIN_FREE", 2 * 1024**3))
+
+# Bare mirrors of previously scanned repositories, used as clone references
+REFERENCE_CACHE_DIR = os.getenv("SCANNER_REF_CACHE_DIR", "/var/cache/scanner/refs")
+
+# Limit in seconds for each git clone or mirror update. The eventlet pool does
+# not enforce Celery's task time limits, so a stalled remote must not be able
+# to hold a worker forever.
+GIT_TIMEOUT = int(os.getenv("SCANNER_GIT_TIMEOUT", "300"))
+# How long to wait for another scan's update of the same mirror; that update is
+# itself bounded by GIT_TIMEOUT
+MIRROR_LOCK_TIMEOUT = GIT_TIMEOUT + 30
+
+# Exit code of `timeout` when the scan is stopped for running too long
+TIMEOUT_EXIT_CODE = 124
+# Seconds `timeout` waits after SIGTERM before sending SIGKILL
+TIMEOUT_KILL_GRACE = 5
+# Exit code of a scanner killed by SIGKILL, e.g. by the kernel's OOM killer
+SIGKILL_EXIT_CODE = 137
+
+# Last line the scanner prints on stdout, followed by a tab and the issue count
+RESULTS_SENTINEL = b"__SCAN_DONE__"
+
+
+class ScanTimeoutError(Exception):
+    """Raised when the scanner runs longer than the allowed timeout."""
+
+
+# Long-running scanner containers, keyed by image name
+_scanner_pool = {}
+_scanner_pool_lock = threading.Lock()
+
+# Shared Docker client, so all scans reuse the same socket connection pool
+_docker_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Returns the process-wide Docker client, creating it on first use."""
+    global _docker_client
+    with _client_lock:
+        if _docker_client is None:
+            _docker_client = docker.from_env(max_pool_size=64, timeout=120)
+            log.info("Docker client initialized")
+        return _docker_client
+
+
+def _git_env() -> dict:
+    """Returns the environment for git commands, with credential prompts disabled."""
+    return {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+
+def _lock_file(lock_file, timeout: float):
+    """
+    Takes an exclusive lock on an open file, polling so green threads can run.
+
+    Raises:
+        TimeoutError: If the lock is not acquired within timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lock on {lock_file.name}")
+            time.sleep(0.1)
+
+
+def _is_blobless_mirror(mirror_dir: str) -> bool:
+    """Whether a mirror was created as a blobless partial clone."""
+    result = subprocess.run(
+        [
+            "git",
+            "-C",
+            mirror_dir,
+            "config",
+            "--get",
+            "remote.origin.partialclonefilter",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip() == "blob:none"
+
+
+def _update_reference_mirror(git_url: str) -> Optional[str]:
+    """
+    Creates or refreshes the local bare mirror of a repository.
+
+    Returns:
+        The path of the mirror, or None if it could not be updated, in which
+        case the repository is cloned without a reference.
+    """
+    url_hash = hashlib.sha1(git_url.encode()).hexdigest()
+    mirror_dir = os.path.join(REFERENCE_CACHE_DIR, f"{url_hash}.git")
+
+    try:
+        os.makedirs(REFERENCE_CACHE_DIR, exist_ok=True)
+        with open(f"{mirror_dir}.lock", "w") as lock_file:
+            _lock_file(lock_file, MIRROR_LOCK_TIMEOUT)
+            if os.path.isdir(mirror_dir) and not _is_blobless_mirror(mirror_dir):
+                # Mirrors from before blobless mirroring hold every blob, and
+                # --dissociate would copy all of them into each scan clone
+                log.info(f"Replacing full reference mirror for {git_url}")
+                shutil.rmtree(mirror_dir)
+            if os.path.isdir(mirror_dir):
+                log.info(f"Updating reference mirror for {git_url}")
+                command = ["git", "-C", mirror_dir, "remote", "update", "--prune"]
+            else:
+                log.info(f"Creating reference mirror for {git_url}")
+                # Blobless like the scan clones: --dissociate copies every
+                # object in the mirror into the job directory
+                command = [
+                    "git",
+                    "clone",
+                    "--mirror",
+                    "--filter=blob:none",
+                    git_url,
+                    mirror_dir,
+                ]
+            try:
+                subprocess.run(
+                    command,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                    env=_git_env(),
+                    timeout=GIT_TIMEOUT,
+                )
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                # Don't leave a half-written mirror behind
+                if command[1] == "clone":
+                    shutil.rmtree(mirror_dir, ignore_errors=True)
+                raise
+        return mirror_dir
+    except subprocess.CalledProcessError as e:
+        log.warning(f"Could not update reference mirror for {git_url}: {e.stderr}")
+    except subprocess.TimeoutExpired:
+        log.warning(
+            f"Reference mirror update for {git_url} timed out after {GIT_TIMEOUT} seconds"
+        )
+    except OSError as e:
+        log.warning(f"Could not update reference mirror for {git_url}: {e}")
+    return None
+
+
+def _choose_scratch_dir() -> str:
+    """Returns the directory to clone a job into, falling back to disk if low on RAM."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    if JOBS_DIR == DISK_JOBS_DIR:
+        return JOBS_DIR
+    if shutil.disk_usage(JOBS_DIR).free > SCRATCH_MIN_FREE_BYTES:
+        return JOBS_DIR
+
+    log.warning(f"Not enough free space in {JOBS_DIR}, using {DISK_JOBS_DIR}")
+    os.makedirs(DISK_JOBS_DIR, exist_ok=True)
+    return DISK_JOBS_DIR
+
+
+def _build_clone_command(
+    git_url: str, repo_dir: str, need_history: bool, reference: Optional[str] = None
+) -> list:
+    """
+    Builds the `git clone` command for a scan.
+
+    Uses a blobless partial clone of the default branch only, so history is
+    fetched as commits and trees while file contents are downloaded just for
+    the checked-out revision. When no history is needed the clone is also
+    truncated to a single commit. With a reference mirror, objects it already
+    has are not downloaded again; --dissociate copies the mirror's objects into
+    the clone, which is why the mirror is blobless as well.
+    """
+    command = ["git", "clone", "--filter=blob:none", "--no-tags", "--single-branch"]
+    if not need_history:
+        command.append("--depth=1")
+    if reference:
+        command.extend(["--reference-if-able", reference, "--dissociate"])
+    command.extend([git_url, repo_dir])
+    return command
+
+
+def _get_warm_scanner(client, scanner_image: str):
+    """
+    Returns a running scanner container for the given image, starting one if needed.
+
+    The container idles on `sleep infinity` with the shared jobs directory
+    mounted, and each scan is executed inside it with `exec_run`.
+    """
+    with _scanner_pool_lock:
+        container = _scanner_pool.get(scanner_image)
+        if container is not None:
+            try:
+                container.reload()
+                if container.status == "running":
+                    return container
+            except docker.errors.NotFound:
+                pass
+            log.warning(f"Warm scanner container for {scanner_image} is gone")
+
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        container = client.containers.run(
+            scanner_image,
+            entrypoint=["sleep", "infinity"],
+            # sleep doesn't reap orphans, so let docker-init reap finished scans
+            init=True,
+            volumes={JOBS_DIR: {"bind": JOBS_MOUNT, "mode": "ro"}},
+            detach=True,
+            auto_remove=True,
+        )
+        _scanner_pool[scanner_image] = container
+        log.info(f"Started warm scanner container {container.short_id}")
+        return container
+
+
+def _discard_warm_scanner(scanner_image: str):
+    """Forgets and kills the pooled container for the given image, if any."""
+    with _scanner_pool_lock:
+        container = _scanner_pool.pop(scanner_image, None)
+    if container is not None:
+        try:
+            container.kill()
+        except docker.errors.APIError:
+            pass  # Already stopped or removed
+
+
+@atexit.register
+def _shutdown_scanner_pool():
+    """Stops all warm scanner containers when the process exits."""
+    for scanner_image in list(_scanner_pool):
+        _discard_warm_scanner(scanner_image)
+
+
+def _collect_scan_output(chunks):
+    """
+    Parses the scanner's output stream as it arrives.
+
+    The scanner prints one JSON issue per line on stdout, terminated by the
+    results sentinel. Anything written to stderr is kept as logs.
+
+    Args:
+        chunks: An iterable of (stdout, stderr) byte chunks, either may be None.
+
+    Returns:
+        A tuple of (issues, reported_total, logs). reported_total is None if
+        the sentinel was never received.
+    """
+    issues = []
+    reported_total = None
+    log_parts = []
+    pending = b""
+
+    def handle_line(line: bytes):
+        nonlocal reported_total
+        if line.startswith(b"{"):
+            issues.append(orjson.loads(line))
+        elif line.startswith(RESULTS_SENTINEL):
+            reported_total = int(line.split(b"\t", 1)[1])
+        elif line.strip():
+            log_parts.append(line + b"\n")
+
+    for stdout, stderr in chunks:
+        if stderr:
+            log_parts.append(stderr)
+        if stdout:
+            pending += stdout
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                handle_line(line)
+    if pending:
+        handle_line(pending)
+
+    logs = b"".join(log_parts).decode("utf-8", errors="replace")
+    return issues, reported_total, logs
+
+
+def _scanner_environment(need_history: bool) -> dict:
+    """Returns environment variables for the scanner process."""
+    # Without history there is nothing for the churn checker to analyze
+    return {} if need_history else {"ENABLE_CHURN": "0"}
+
+
+def _run_warm_scan(
+    client, scanner_image: str, repo_dir: str, timeout: int, need_history: bool
+):
+    """
+    Runs the scanner for a job inside the warm container.
+
+    The repository must have been cloned into JOBS_DIR.
+
+    Returns:
+        A tuple of (exit_code, issues, reported_total, logs).
+    """
+    container = _get_warm_scanner(client, scanner_image)
+    # `timeout` inside the container acts as the watchdog for the exec. It sends
+    # SIGTERM, so a timeout exits with 124 and is not mistaken for a SIGKILL.
+    exec_id = client.api.exec_create(
+        container.id,
+        [
+            "timeout",
+            "-k",
+            str(TIMEOUT_KILL_GRACE),
+            str(timeout),
+            "python",
+            "run_checks.py",
+            f"{JOBS_MOUNT}/{os.path.basename(repo_dir)}",
+        ],
+        environment=_scanner_environment(need_history),
+    )["Id"]
+    stream = client.api.exec_start(exec_id, stream=True, demux=True)
+    issues, reported_total, logs = _collect_scan_output(stream)
+    exit_code = client.api.exec_inspect(exec_id)["ExitCode"]
+    if exit_code == TIMEOUT_EXIT_CODE:
+        raise ScanTimeoutError()
+    return exit_code, issues, reported_total, logs
+
+
+def _is_read_timeout(error: Exception) -> bool:
+    """
+    Whether a requests ConnectionError was caused by a read timeout.
+
+    Over docker's unix socket a timed-out read is reported as a ConnectionError
+    wrapping urllib3's ReadTimeoutError, possibly inside a MaxRetryError.
+    """
+    seen = set()
+    pending = [error]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, urllib3.exceptions.ReadTimeoutError):
+            return True
+        if isinstance(current, BaseException):
+            pending.extend(current.args[:1])
+            pending.extend([current.__cause__, current.__context__])
+            pending.append(getattr(current, "reason", None))
+    return False
+
+
+def _run_cold_scan(
+    client, scanner_image: str, repo_dir: str, timeout: int, need_history: bool
+):
+    """
+    Runs the scanner in a new, single-use container.
+
+    Returns:
+        A tuple of (exit_code, issues, reported_total, logs).
+    """
+    container = client.containers.run(
+        scanner_image,
+        volumes={repo_dir: {"bind": "/repo", "mode": "ro"}},
+        environment=_scanner_environment(need_history),
+        detach=True,
+    )
+    try:
+        # Wait for the container to finish, with a timeout
+        try:
+            result = container.wait(timeout=timeout)
+        except requests.exceptions.ReadTimeout as e:
+            raise ScanTimeoutError() from e
+        except requests.exceptions.ConnectionError as e:
+            if _is_read_timeout(e):
+                raise ScanTimeoutError() from e
+            raise
+        stdout = container.logs(stream=True, stdout=True, stderr=False)
+        stderr = container.logs(stdout=False, stderr=True)
+        issues, reported_total, logs = _collect_scan_output(
+            [*((chunk, None) for chunk in stdout), (None, stderr)]
+        )
+        return result["StatusCode"], issues, reported_total, logs
+    finally:
+        # Kill and remove the container if it's still running (e.g., on timeout).
+        # SIGKILL avoids waiting out the grace period of a regular stop.
+        try:
+            container.reload()
+            if container.status == "running":
+                container.kill(signal="SIGKILL")
+            container.remove(force=True)
+        except docker.errors.NotFound:
+            pass  # Container already removed
+        except Exception as e:
+            log.error(f"Error during container cleanup: {e}", exc_info=True)
+
 
 def scan_repo_with_docker(
-    git_url: str, scanner_image: str = "scanner-image:latest", timeout: int = 60
+    git_url: str,
+    scanner_image: str = SCANNER_IMAGE,
+    timeout: int = 60,
+    need_history: bool = True,
+    scanner_slot: Callable[[], ContextManager] = contextlib.nullcontext,
 ):
     """
     Clones a Git repository, runs a Docker-based scan on it, and returns the results.
 
+    The scan is executed in a long-running scanner container when possible,
+    falling back to a single-use container if that fails.
+
     Args:
         git_url: The URL of the Git repository to scan.
         scanner_image: The name of the Docker image to use for scanning.
         timeout: The maximum time in seconds to allow the scanner container to run.
+        need_history: Whether commit history is required (e.g. for the churn
+            checker). When False, a shallow clone of the latest commit is used.
+        scanner_slot: Returns a context manager held only while the scanner
+            runs, e.g. to limit concurrent scanner containers. Cloning happens
+            outside of it, so clones can overlap with other scans.
 
     Returns:
         A dictionary containing the scan results, or an error message.
     """
     job_id = str(uuid.uuid4())
     log.info(f"Starting scan job {job_id} for {git_url}")
-    base_temp_dir = tempfile.gettempdir()
-    job_dir = os.path.join(base_temp_dir, job_id)
-    repo_dir = os.path.join(job_dir, "repo")
-    output_dir = os.path.join(job_dir, "output")
-    results_file = os.path.join(output_dir, "results.json")
 
     try:
-        # Create temporary directories
-        os.makedirs(repo_dir, exist_ok=True)
-        os.makedirs(output_dir, exist_ok=True)
-        log.info(f"[{job_id}] Created temporary directories: {job_dir}")
-
-        # Clone the repository
-        log.info(f"[{job_id}] Cloning repository: {git_url}")
-        # Use subprocess to ensure we get full history
-        try:
-            subprocess.run(
-                ["git", "clone", git_url, repo_dir],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-        except subprocess.CalledProcessError as e:
-            log.error(f"[{job_id}] Git clone failed for {git_url}. Error: {e.stderr}")
-            raise  # Re-raise the exception to be caught by the main handler
-
-        log.info(f"[{job_id}] Repository cloned to: {repo_dir}")
-
-        # Initialize Docker client
-        client = docker.from_env()
-        log.info(f"[{job_id}] Docker client initialized")
-        # Define volume mounts
-        volumes = {
-            repo_dir: {"bind": "/repo", "mode": "ro"},
-            output_dir: {"bind": "/output", "mode": "rw"},
-        }
-
-        log.info(f"[{job_id}] Running scanner container '{scanner_image}'")
-        container = client.containers.run(
-            scanner_image,
-            volumes=volumes,
-            detach=True,
-        )
+        # The temporary directory is removed when the scan finishes or fails
+        scratch_dir = _choose_scratch_dir()
+        with tempfile.TemporaryDirectory(
+            prefix=f"{job_id}-", dir=scratch_dir
+        ) as repo_dir:
+            log.info(f"[{job_id}] Created temporary directory: {repo_dir}")
 
-        # Wait for the container to finish, with a timeout
-        result = container.wait(timeout=timeout)
+            # Clone the repository
+            reference = _update_reference_mirror(git_url)
+            log.info(f"[{job_id}] Cloning repository: {git_url}")
+            try:
+                subprocess.run(
+                    _build_clone_command(git_url, repo_dir, need_history, reference),
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                    env=_git_env(),
+                    timeout=GIT_TIMEOUT,
+                )
+            except subprocess.CalledProcessError as e:
+                log.error(
+                    f"[{job_id}] Git clone failed for {git_url}. Error: {e.stderr}"
+                )
+                raise  # Re-raise the exception to be caught by the main handler
+            except subprocess.TimeoutExpired:
+                log.error(
+                    f"[{job_id}] Git clone of {git_url} timed out after {GIT_TIMEOUT} seconds"
+                )
+                raise
 
-        container_logs = container.logs().decode("utf-8")
-        log.info(
-            f"[{job_id}] Container finished with exit code {result['StatusCode']}."
-        )
-        log.debug(f"[{job_id}] Full container logs:\n{container_logs}")
+            log.info(f"[{job_id}] Repository cloned to: {repo_dir}")
+
+            with scanner_slot():
+                client = _get_client()
+
+                log.info(f"[{job_id}] Running scanner '{scanner_image}'")
+                result = None
+                if scratch_dir == JOBS_DIR:
+                    try:
+                        result = _run_warm_scan(
+                            client, scanner_image, repo_dir, timeout, need_history
+                        )
+                    except docker.errors.ImageNotFound:
+                        raise
+                    except docker.errors.APIError as e:
+                        log.warning(
+                            f"[{job_id}] Warm scanner unavailable ({e}), using a new container"
+                        )
+                        _discard_warm_scanner(scanner_image)
+                if result is None:
+                    result = _run_cold_scan(
+                        client, scanner_image, repo_dir, timeout, need_history
+                    )
+            exit_code, scan_results, reported_total, container_logs = result
+
+            log.info(f"[{job_id}] Scanner finished with exit code {exit_code}.")
+            log.debug(f"[{job_id}] Full container logs:\n{container_logs}")
+            if exit_code == SIGKILL_EXIT_CODE:
+                log.warning(
+                    f"[{job_id}] Scanner was killed by SIGKILL (exit code {exit_code}), possibly out of memory"
+                )
+
+            # Check that the scanner reported all of its results
+            if reported_total is None:
+                log.error(
+                    f"[{job_id}] Scan failed: no results reported. Container logs: {container_logs}"
+                )
+                return {
+                    "error": f"Scanner did not report results (exit code {exit_code})",
+                    "logs": container_logs,
+                }
+            if reported_total != len(scan_results):
+                log.error(
+                    f"[{job_id}] Scan failed: expected {reported_total} issues, received {len(scan_results)}"
+                )
+                return {"error": "Incomplete scan results", "logs": container_logs}
 
-        # Check if results file exists
-        if os.path.exists(results_file):
-            with open(results_file, "r") as f:
-                scan_results = json.load(f)
             log.info(f"[{job_id}] Scan complete. Found {len(scan_results)} issues.")
             return scan_results
-        else:
-            log.error(
-                f"[{job_id}] Scan failed: results.json not found. Container logs: {container_logs}"
-            )
-            return {"error": "results.json not found", "logs": container_logs}
-
-    except git.GitCommandError as e:
-        log.error(f"[{job_id}] Git clone command error: {e}")
-        return {"error": f"Git clone failed: {e}"}
+
+    except subprocess.CalledProcessError as e:
+        return {"error": f"Git clone failed: {e.stderr}"}
+    except subprocess.TimeoutExpired:
+        return {"error": f"Git clone timed out after {GIT_TIMEOUT} seconds."}
     except docker.errors.ContainerError as e:
         log.error(
             f"[{job_id}] Docker container execution failed: {e.stderr}", exc_info=True
@@ -105,34 +546,18 @@ def scan_repo_with_docker(
     except docker.errors.ImageNotFound:
         log.error(f"[{job_id}] Docker image not found: {scanner_image}")
         return {"error": f"Docker image not found: {scanner_image}"}
+    except ScanTimeoutError:
+        log.error(f"[{job_id}] Scan timed out after {timeout} seconds.")
+        return {"error": f"Scan timed out after {timeout} seconds."}
+    except docker.errors.APIError as e:
+        log.error(f"[{job_id}] Docker API error: {e}", exc_info=True)
+        return {"error": f"Docker API error: {e}"}
     except Exception as e:
-        # This will catch the timeout from container.wait
-        if "Timeout" in str(e):
-            log.error(f"[{job_id}] Scan timed out after {timeout} seconds.")
-            return {"error": f"Scan timed out after {timeout} seconds."}
         log.error(
             f"[{job_id}] An unexpected error occurred in docker_runner: {e}",
             exc_info=True,
         )
         return {"error": f"An unexpected error occurred: {e}"}
-    finally:
-        # Clean up the temporary directory
-        if os.path.exists(job_dir):
-            shutil.rmtree(job_dir)
-            log.info(f"[{job_id}] Cleaned up temporary directory: {job_dir}")
-
-        # Stop and remove the container if it's still running (e.g., on timeout)
-        try:
-            if "container" in locals() and container.status == "running":
-                container.stop()
-                log.info(f"[{job_id}] Stopped container.")
-            if "container" in locals():
-                container.remove()
-                log.info(f"[{job_id}] Removed container.")
-        except docker.errors.NotFound:
-            pass  # Container already removed
-        except Exception as e:
-            log.error(f"[{job_id}] Error during container cleanup: {e}", exc_info=True)
 
 
 if __name__ == "__main__":
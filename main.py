@@ -1,17 +1,16 @@
 import uvicorn
-from dotenv import load_dotenv
 from fastapi import FastAPI
 
+from config.app_config import initialize_app
+
+# Load .env before importing modules that read settings at import time
+initialize_app()
+
 from routes.scan import router as scan_router
-from storage import SupabaseStorageService
 from config.logging_config import setup_logging
 
-load_dotenv()
-
 logger = setup_logging()
 
-storage_service = SupabaseStorageService()
-
 
 app = FastAPI(
     title="Tech Debt Analyzer API",
@@ -1,5 +1,8 @@
+from typing import List
+from celery import group
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, HttpUrl
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, HttpUrl, conlist
 from logging import getLogger
 from scan_task import scan_repo
 
@@ -7,6 +10,12 @@ logger = getLogger(__name__)
 
 router = APIRouter()
 
+# Most repositories accepted in one batch request
+MAX_BATCH_SIZE = 100
+
+# Signature reused for every submission; each scan clones it with its own args
+_scan_sig = scan_repo.s()
+
 
 class ScanResponse(BaseModel):
     task_id: str
@@ -19,6 +28,17 @@ class ScanRequest(BaseModel):
     git_url: HttpUrl
 
 
+class BatchScanResponse(BaseModel):
+    group_id: str
+    task_ids: List[str]
+    status: str
+    message: str
+
+
+class BatchScanRequest(BaseModel):
+    git_urls: conlist(HttpUrl, min_length=1, max_length=MAX_BATCH_SIZE)
+
+
 @router.post("/scan", response_model=ScanResponse)
 async def scan(request: ScanRequest):
     """
@@ -29,8 +49,8 @@ async def scan(request: ScanRequest):
     logger.info(f"Starting scan for repository: {git_url}")
 
     try:
-        # Submit the task to Celery
-        task = scan_repo.delay(git_url)
+        # Submit the task to Celery off the event loop, as publishing blocks
+        task = await run_in_threadpool(_scan_sig.clone(args=(git_url,)).apply_async)
         logger.info(f"Scan task submitted with ID: {task.id}")
 
         return ScanResponse(
@@ -44,3 +64,39 @@ async def scan(request: ScanRequest):
         raise HTTPException(
             status_code=500, detail=f"Failed to submit scan task: {str(e)}"
         )
+
+
+def _submit_scan_group(git_urls: List[str]):
+    """Submit a scan task per repository and save the group result."""
+    group_result = group(
+        _scan_sig.clone(args=(git_url,)) for git_url in git_urls
+    ).apply_async()
+    group_result.save()
+    return group_result
+
+
+@router.post("/scan/batch", response_model=BatchScanResponse)
+async def scan_batch(request: BatchScanRequest):
+    """
+    Start scans for several repositories at once.
+    Returns a group ID and the task ID of each scan.
+    """
+    git_urls = [str(git_url) for git_url in request.git_urls]
+    logger.info(f"Starting batch scan for {len(git_urls)} repositories")
+
+    try:
+        # Submit all scans as one Celery group, off the event loop
+        group_result = await run_in_threadpool(_submit_scan_group, git_urls)
+        logger.info(f"Batch scan submitted with group ID: {group_result.id}")
+
+        return BatchScanResponse(
+            group_id=group_result.id,
+            task_ids=[result.id for result in group_result.results],
+            status="submitted",
+            message=f"{len(git_urls)} scan tasks submitted successfully",
+        )
+    except Exception as e:
+        logger.error(f"Failed to submit batch scan: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Failed to submit batch scan: {str(e)}"
+        )
@@ -1,16 +1,88 @@
+import contextlib
+import functools
+import os
+import time
 from logging import getLogger
+
+import redis
 from celery import Celery
+from config.app_config import initialize_app
+
+# Load .env before importing modules that read settings at import time
+initialize_app()
+
 from docker_runner import scan_repo_with_docker
-from storage import SupabaseStorageService
-from dotenv import load_dotenv
+from storage import storage_service
+from config.celery_config import redis_url, task_time_limit
 
 logger = getLogger(__name__)
-load_dotenv()
 
 # Create Celery app
 celery_app = Celery("tech_debt_analyzer")
 celery_app.config_from_object("config.celery_config")
 
+# Limit on scanner containers running at the same time across all workers.
+# Workers may clone many more repositories; their scans wait for a free slot.
+MAX_CONCURRENT_SCANS = int(os.getenv("MAX_CONCURRENT_SCANS", "8"))
+SCANNER_SEMAPHORE_KEY = "scanner_busy"
+SCANNER_SLOT_POLL_INTERVAL = 1  # seconds
+
+redis_client = redis.Redis.from_url(redis_url)
+
+# Reaps stale slots and takes a free one in a single atomic step, so the cap
+# holds even when many workers race for the last slot. Timestamps come from
+# the Redis server's clock, which keeps reaping independent of worker clocks.
+# KEYS[1]: the slot set; ARGV: token, stale age in seconds, slot count
+_ACQUIRE_SLOT_SCRIPT = redis_client.register_script(
+    """
+    redis.replicate_commands()
+    local now = tonumber(redis.call("TIME")[1])
+    redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - tonumber(ARGV[2]))
+    if redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[3]) then
+        redis.call("ZADD", KEYS[1], now, ARGV[1])
+        return 1
+    end
+    return 0
+    """
+)
+
+
+def _acquire_scanner_slot(token: str) -> bool:
+    """
+    Try to take one of the scanner slots, stored as a Redis sorted set.
+
+    Slots older than the task time limit are assumed to belong to a crashed
+    worker and are released.
+    """
+    acquired = _ACQUIRE_SLOT_SCRIPT(
+        keys=[SCANNER_SEMAPHORE_KEY],
+        args=[token, task_time_limit, MAX_CONCURRENT_SCANS],
+    )
+    return bool(acquired)
+
+
+def _release_scanner_slot(token: str):
+    """Give back a scanner slot taken with _acquire_scanner_slot."""
+    redis_client.zrem(SCANNER_SEMAPHORE_KEY, token)
+
+
+@contextlib.contextmanager
+def _scanner_slot(token: str):
+    """
+    Hold a scanner slot, waiting until one is free.
+
+    The repository is already cloned by then, so the task waits rather than
+    retrying. Sleeping yields to other green threads on the eventlet pool.
+    """
+    if not _acquire_scanner_slot(token):
+        logger.info(f"[{token}] All scanner slots busy, waiting")
+        while not _acquire_scanner_slot(token):
+            time.sleep(SCANNER_SLOT_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        _release_scanner_slot(token)
+
 
 @celery_app.task(bind=True)
 def scan_repo(self, git_url: str):
@@ -29,26 +101,31 @@ def scan_repo(self, git_url: str):
     try:
         # Run the Docker-based scan
         logger.info(f"[{task_id}] Running Docker scan for {git_url}")
-        scan_results = scan_repo_with_docker(git_url)
+        scan_results = scan_repo_with_docker(
+            git_url, scanner_slot=functools.partial(_scanner_slot, task_id)
+        )
 
-        # Check if scan was successful
-        if "error" in scan_results:
+        # Check if scan was successful; failures are reported as a dict
+        if isinstance(scan_results, dict) and "error" in scan_results:
             logger.error(f"[{task_id}] Scan failed: {scan_results['error']}")
             raise Exception(f"Scan failed: {scan_results['error']}")
 
         logger.info(
             f"[{task_id}] Docker scan completed successfully. Found {len(scan_results)} issues."
         )
-        storage_service = SupabaseStorageService()
-
-        try:
-            logger.info(f"[{task_id}] Storing scan results in database")
-            scan_id = storage_service.store_scan_results(git_url, scan_results)
-            logger.info(f"[{task_id}] Scan results stored with ID: {scan_id}")
-        except Exception as e:
-            logger.error(
-                f"[{task_id}] Failed to store scan results: {e}", exc_info=True
-            )
+
+        scan_id = None
+        if storage_service.is_available():
+            try:
+                logger.info(f"[{task_id}] Storing scan results in database")
+                scan_id = storage_service.store_scan_results(git_url, scan_results)
+                logger.info(f"[{task_id}] Scan results stored with ID: {scan_id}")
+            except Exception as e:
+                logger.error(
+                    f"[{task_id}] Failed to store scan results: {e}", exc_info=True
+                )
+        else:
+            logger.warning(f"[{task_id}] Storage unavailable, results not stored")
 
         result = {
             "git_url": git_url,
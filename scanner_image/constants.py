@@ -1,7 +1,10 @@
-ISSUE_TYPES = {
-    "RADON_COMPLEXITY": "Complexity",
-    "GIT_CHURN": "Churn",
-    "COVERAGE": "Coverage",
-    "FLAKE8": "Flake8",
-    "TODO_COMMENT": "TODO",
-}
+from types import SimpleNamespace
+
+# Issue type names reported by the plugins, read as ISSUE_TYPES.FLAKE8 etc.
+ISSUE_TYPES = SimpleNamespace(
+    RADON_COMPLEXITY="Complexity",
+    GIT_CHURN="Churn",
+    COVERAGE="Coverage",
+    FLAKE8="Flake8",
+    TODO_COMMENT="TODO",
+)
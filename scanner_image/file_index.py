@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+from typing import Iterator, Optional
+from file_walker import parallel_walk
+
+# Files up to this size are read into memory while the tree is walked
+MAX_CACHED_FILE_SIZE = int(os.getenv("FILE_INDEX_MAX_FILE_SIZE", 1024 * 1024))
+# Upper bound on the total size of cached contents; larger repos read the rest on demand
+MAX_CACHED_BYTES = int(os.getenv("FILE_INDEX_MAX_BYTES", 256 * 1024 * 1024))
+
+# Common binary file extensions; these are never read as text
+BINARY_EXT = (
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".zip",
+    ".tar",
+    ".gz",
+    ".ico",
+    ".pdf",
+    ".svg",
+)
+
+
+class FileIndex:
+    """
+    The files of a repository, listed with a single walk of the tree.
+
+    The walk also reads small text files, so plugins that look at the same
+    files share one read of each instead of walking and reading on their own.
+    """
+
+    def __init__(
+        self,
+        repo_path: str,
+        max_file_size: int = MAX_CACHED_FILE_SIZE,
+        max_cached_bytes: int = MAX_CACHED_BYTES,
+    ):
+        self.repo_path = repo_path
+        self._sizes = {}
+        self._contents = {}
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+        def visit_file(filepath: str) -> list:
+            try:
+                size = os.stat(filepath).st_size
+            except OSError as e:
+                print(f"Could not stat file {filepath}: {e}", file=sys.stderr)
+                return []
+            data = None
+            if size <= max_file_size and not filepath.endswith(BINARY_EXT):
+                with self._lock:
+                    reserved = self._cached_bytes + size <= max_cached_bytes
+                    if reserved:
+                        self._cached_bytes += size
+                if reserved:
+                    try:
+                        with open(filepath, "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        # Reported by the plugin that reads it again
+                        pass
+            return [(filepath, size, data)]
+
+        for filepath, size, data in parallel_walk(repo_path, visit_file):
+            self._sizes[filepath] = size
+            if data is not None:
+                self._contents[filepath] = data
+        self._paths = sorted(self._sizes)
+
+    def python_files(self) -> Iterator[str]:
+        """Yields the paths of all Python source files."""
+        return (path for path in self._paths if path.endswith(".py"))
+
+    def text_files(self) -> Iterator[str]:
+        """Yields the paths of all files that are not known binary formats."""
+        return (path for path in self._paths if not path.endswith(BINARY_EXT))
+
+    def size(self, filepath: str) -> Optional[int]:
+        """Returns the size of a file in bytes, or None if it is not indexed."""
+        return self._sizes.get(filepath)
+
+    def is_cached(self, filepath: str) -> bool:
+        """Whether the contents of a file were read during the walk."""
+        return filepath in self._contents
+
+    def read(self, filepath: str) -> bytes:
+        """Returns the contents of a file, from the cache when possible."""
+        data = self._contents.get(filepath)
+        if data is None:
+            with open(filepath, "rb") as f:
+                data = f.read()
+        return data
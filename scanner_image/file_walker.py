@@ -0,0 +1,78 @@
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+# Directories that are never descended into: VCS metadata, caches, dependencies
+SKIP_DIRS = frozenset({".git", "__pycache__", "node_modules", ".venv"})
+
+
+def _default_workers() -> int:
+    return min(32, (os.cpu_count() or 1) * 4)
+
+
+def parallel_walk(
+    root: str,
+    visit_file: Callable[[str], list],
+    exts: Optional[tuple] = None,
+    skip_dirs: Iterable[str] = SKIP_DIRS,
+    max_workers: Optional[int] = None,
+) -> list:
+    """
+    Walks a directory tree with a pool of threads, visiting every file.
+
+    Each worker takes a directory from a shared queue, lists it with
+    os.scandir, queues its subdirectories and calls visit_file on its files.
+    File system calls release the GIL, so listing and reading overlap.
+    Skipped directories are pruned before they are listed, and entry types
+    come from the directory listing itself, without extra stat calls.
+
+    Args:
+        root: The directory to walk.
+        visit_file: Called with the path of each file; returns a list of results.
+        exts: If given, only files ending with one of these extensions are visited.
+        skip_dirs: Names of directories that are not descended into.
+        max_workers: Number of threads. Defaults to min(32, cpu_count * 4).
+
+    Returns:
+        The combined results of all visit_file calls.
+    """
+    max_workers = max_workers or _default_workers()
+    skip_dirs = frozenset(skip_dirs)
+    dir_queue = queue.Queue()
+    dir_queue.put(root)
+
+    def worker() -> list:
+        results = []
+        while True:
+            directory = dir_queue.get()
+            if directory is None:
+                return results
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in skip_dirs:
+                                dir_queue.put(entry.path)
+                        elif entry.is_file() and (
+                            exts is None or entry.name.endswith(exts)
+                        ):
+                            results.extend(visit_file(entry.path))
+            except OSError as e:
+                print(f"Could not scan directory {directory}: {e}", file=sys.stderr)
+            finally:
+                dir_queue.task_done()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(worker) for _ in range(max_workers)]
+        # Once every queued directory is processed, tell the workers to stop
+        dir_queue.join()
+        for _ in futures:
+            dir_queue.put(None)
+        wait(futures)
+
+    all_results = []
+    for future in futures:
+        all_results.extend(future.result())
+    return all_results
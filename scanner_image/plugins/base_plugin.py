@@ -1,4 +1,18 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+from file_index import FileIndex
+
+
+@dataclass(slots=True)
+class Issue:
+    """A single finding reported by a plugin."""
+
+    type: str
+    file: str
+    line: int
+    code: str
+    message: str
 
 
 class BasePlugin(ABC):
@@ -8,15 +22,17 @@ class BasePlugin(ABC):
     """
 
     @abstractmethod
-    def run(self, repo_path: str) -> list[dict]:
+    def run(self, repo_path: str, index: Optional[FileIndex] = None) -> list[Issue]:
         """
         Run the plugin's check on the given repository.
 
         Args:
             repo_path: The absolute path to the cloned repository inside the container.
+            index: The repository's files, shared by all plugins of a scan.
+                Plugins that read files build their own index when it is None.
 
         Returns:
-            A list of dictionaries, where each dictionary represents a found issue.
+            A list of Issue objects, one for each found issue.
             An empty list should be returned if no issues are found.
         """
         pass
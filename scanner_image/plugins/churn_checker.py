@@ -1,22 +1,38 @@
-from .base_plugin import BasePlugin
+from .base_plugin import BasePlugin, Issue
 from constants import ISSUE_TYPES
+from file_index import FileIndex
+from typing import Optional
+from collections import Counter
 import subprocess
 import sys
 import os
 
+# Size of each read from the git log output
+LOG_READ_SIZE = 64 * 1024
+
 
 class ChurnChecker(BasePlugin):
     """
     A plugin to analyze code churn using git history.
     """
 
-    def run(self, repo_path: str) -> list[dict]:
+    def run(self, repo_path: str, index: Optional[FileIndex] = None) -> list[Issue]:
         """
         Analyzes the git log to find files with high churn.
-        NOTE: This requires a full git clone (not shallow) to work properly.
+        NOTE: This requires the full commit history (not a shallow clone). A
+        blobless partial clone is sufficient since only commits and trees are read.
+
+        The ENABLE_CHURN environment variable controls when the check runs:
+        "0" always skips it, "1" runs it even on shallow clones, and by
+        default it runs unless the clone is shallow.
         """
         print("Running Churn checker...")
         issues = []
+        enable_churn = os.getenv("ENABLE_CHURN")
+
+        if enable_churn == "0":
+            print("Churn checker: Disabled by ENABLE_CHURN. Skipping git analysis.")
+            return issues
 
         # Check if this is a git repository
         git_dir = os.path.join(repo_path, ".git")
@@ -24,61 +40,62 @@ class ChurnChecker(BasePlugin):
             print("Churn checker: No .git directory found. Skipping git analysis.")
             return issues
 
+        if enable_churn != "1" and os.path.exists(os.path.join(git_dir, "shallow")):
+            print("Churn checker: Shallow clone has no history. Skipping git analysis.")
+            return issues
+
         try:
-            # First, let's check if git works at all
-            test_result = subprocess.run(
-                ["git", "-C", repo_path, "rev-parse", "--git-dir"],
-                capture_output=True,
-                text=True,
-                check=False,
-            )
+            # Stream the git log. Rename detection is disabled because it
+            # compares blob contents, which are not present in a partial clone.
+            # stderr is inherited so it ends up in the scanner logs; an unread
+            # pipe could fill up and block git.
+            with subprocess.Popen(
+                [
+                    "git",
+                    "-C",
+                    repo_path,
+                    "log",
+                    "--no-renames",
+                    "--pretty=format:",
+                    "--name-only",
+                    "-z",
+                ],
+                stdout=subprocess.PIPE,
+                bufsize=LOG_READ_SIZE,
+            ) as process:
+                # Count how often each file was touched, one chunk at a time.
+                # Names are NUL-separated; the last piece of a chunk may be partial.
+                file_counts = Counter()
+                pending = b""
+                while chunk := process.stdout.read(LOG_READ_SIZE):
+                    *names, pending = (pending + chunk).split(b"\0")
+                    file_counts.update(name for name in names if name)
+                if pending:
+                    file_counts[pending] += 1
 
-            if test_result.returncode != 0:
+            if process.returncode != 0:
                 print(
-                    f"Churn checker: Git repository test failed: {test_result.stderr}"
+                    f"Churn checker: Git log command failed with exit code {process.returncode}"
                 )
                 return issues
 
-            # Get the git log
-            result = subprocess.run(
-                ["git", "-C", repo_path, "log", "--pretty=format:", "--name-only"],
-                capture_output=True,
-                text=True,
-                check=False,
-            )
-
-            if result.returncode != 0:
-                print(f"Churn checker: Git log command failed: {result.stderr}")
-                return issues
-
-            if result.stdout.strip():
-                # Process the output: count occurrences, sort, and take top 10
-                lines = result.stdout.strip().split("\n")
-                files = [line for line in lines if line.strip()]
-
-                if not files:
-                    return issues
-
-                file_counts = {}
-                for file in files:
-                    file_counts[file] = file_counts.get(file, 0) + 1
-
-                # Sort by count (descending) and take top 10
-                sorted_files = sorted(
-                    file_counts.items(), key=lambda x: x[1], reverse=True
-                )[:10]
+            # Take the top 10 files, decoding only their names
+            top_files = [
+                (name.decode("utf-8", errors="replace"), count)
+                for name, count in file_counts.most_common(10)
+            ]
 
-                for file_path, commit_count in sorted_files:
-                    if commit_count > 5:  # Only report files with more than 5 commits
-                        issues.append(
-                            {
-                                "type": ISSUE_TYPES.GIT_CHURN,
-                                "file": file_path,
-                                "line": 1,  # Churn is file-level, so line is not applicable
-                                "code": "HIGH_CHURN",
-                                "message": f"File has a high churn rate with {commit_count} commits.",
-                            }
+            for file_path, commit_count in top_files:
+                if commit_count > 5:  # Only report files with more than 5 commits
+                    issues.append(
+                        Issue(
+                            type=ISSUE_TYPES.GIT_CHURN,
+                            file=file_path,
+                            line=1,  # Churn is file-level, so line is not applicable
+                            code="HIGH_CHURN",
+                            message=f"File has a high churn rate with {commit_count} commits.",
                         )
+                    )
 
         except subprocess.CalledProcessError as e:
             print(f"Churn checker failed with CalledProcessError: {e}", file=sys.stderr)
@@ -1,5 +1,7 @@
-from .base_plugin import BasePlugin
+from .base_plugin import BasePlugin, Issue
 from constants import ISSUE_TYPES
+from file_index import FileIndex
+from typing import Optional
 import json
 import os
 import sys
@@ -11,7 +13,7 @@ class CoverageChecker(BasePlugin):
     This is a placeholder and looks for a 'coverage.json' file.
     """
 
-    def run(self, repo_path: str) -> list[dict]:
+    def run(self, repo_path: str, index: Optional[FileIndex] = None) -> list[Issue]:
         """
         Looks for a coverage.json file and reports the overall coverage.
         """
@@ -29,13 +31,13 @@ class CoverageChecker(BasePlugin):
                     coverage_percent = data["totals"]["percent_covered"]
                     if coverage_percent < 80.0:
                         issues.append(
-                            {
-                                "type": ISSUE_TYPES.COVERAGE,
-                                "file": "coverage.json",
-                                "line": 1,
-                                "code": "LOW_COVERAGE",
-                                "message": f"Test coverage is {coverage_percent:.2f}%, which is below the 80% threshold.",
-                            }
+                            Issue(
+                                type=ISSUE_TYPES.COVERAGE,
+                                file="coverage.json",
+                                line=1,
+                                code="LOW_COVERAGE",
+                                message=f"Test coverage is {coverage_percent:.2f}%, which is below the 80% threshold.",
+                            )
                         )
             except json.JSONDecodeError:
                 print(
@@ -1,24 +1,92 @@
+import contextlib
+import os
+import re
 import subprocess
 import sys
-from .base_plugin import BasePlugin
+from .base_plugin import BasePlugin, Issue
 from constants import ISSUE_TYPES
+from file_index import FileIndex
+from typing import Optional
+
+try:
+    from flake8.api import legacy as flake8_api
+    from flake8.formatting.base import BaseFormatter
+except ImportError:
+    flake8_api = None
+
+# Same options as the command line: flake8 . --select=E,W,F --ignore=E501,W503
+FLAKE8_SELECT = ["E", "W", "F"]
+FLAKE8_IGNORE = ["E501", "W503"]
+
+# One flake8 output line: ./path:line:col: CODE message
+FLAKE8_RE = re.compile(
+    r"^\./(?P<file>[^:]+):(?P<line>\d+):\d+:\s+(?P<code>\S+)\s+(?P<msg>.*)$"
+)
 
 
 class Flake8Checker(BasePlugin):
     """A plugin to run flake8 static analysis."""
 
-    def run(self, repo_path: str) -> list[dict]:
+    def run(self, repo_path: str, index: Optional[FileIndex] = None) -> list[Issue]:
         """
         Runs flake8 on the given repository path and returns a list of issues.
         """
         print("Running Flake8 checker...")
+        if flake8_api is not None:
+            try:
+                issues = self._run_in_process(repo_path)
+            except Exception as e:
+                print(f"An error occurred while running flake8: {e}", file=sys.stderr)
+                return []
+        else:
+            issues = self._run_subprocess(repo_path)
+
+        print(f"Flake8 checker found {len(issues)} issues.")
+        return issues
+
+    def _run_in_process(self, repo_path: str) -> list[Issue]:
+        """
+        Runs flake8 through its Python API, avoiding a new interpreter per scan.
+        Violations are collected by a formatter instead of being printed.
+        """
+        issues = []
+
+        class IssueCollector(BaseFormatter):
+            def handle(self, error):
+                issues.append(
+                    Issue(
+                        type=ISSUE_TYPES.FLAKE8,
+                        file=os.path.relpath(error.filename),
+                        line=error.line_number,
+                        code=error.code,
+                        message=error.text,
+                    )
+                )
+
+        # Like the command line, pick up the repository's own flake8 config
+        with contextlib.chdir(repo_path):
+            style_guide = flake8_api.get_style_guide(
+                select=FLAKE8_SELECT, ignore=FLAKE8_IGNORE
+            )
+            style_guide.init_report(IssueCollector)
+            style_guide.check_files(["."])
+        return issues
+
+    def _run_subprocess(self, repo_path: str) -> list[Issue]:
+        """Runs the flake8 command line and parses its output as it streams in."""
         try:
-            result = subprocess.run(
-                ["flake8", ".", "--select=E,W,F", "--ignore=E501,W503"],
+            # stderr is inherited so it ends up in the scanner logs
+            proc = subprocess.Popen(
+                [
+                    "flake8",
+                    ".",
+                    f"--select={','.join(FLAKE8_SELECT)}",
+                    f"--ignore={','.join(FLAKE8_IGNORE)}",
+                ],
                 cwd=repo_path,
-                capture_output=True,
+                stdout=subprocess.PIPE,
                 text=True,
-                check=False,
+                bufsize=1,
             )
         except FileNotFoundError:
             print("Error: flake8 not found. Is it installed?", file=sys.stderr)
@@ -27,26 +95,17 @@ class Flake8Checker(BasePlugin):
             print(f"An error occurred while running flake8: {e}", file=sys.stderr)
             return []
 
-        issues = []
-        for line in result.stdout.strip().split("\n"):
-            if not line:
-                continue
-            parts = line.split(":")
-            if len(parts) >= 4:
-                try:
-                    issues.append(
-                        {
-                            "type": ISSUE_TYPES.FLAKE8,
-                            "file": parts[0][2:],  # remove './'
-                            "line": int(parts[1]),
-                            "code": parts[3].strip().split(" ")[0],
-                            "message": " ".join(parts[3].strip().split(" ")[1:]),
-                        }
-                    )
-                except (ValueError, IndexError):
-                    print(
-                        f"Could not parse flake8 output line: {line}", file=sys.stderr
-                    )
-
-        print(f"Flake8 checker found {len(issues)} issues.")
+        match = FLAKE8_RE.match
+        with proc:
+            issues = [
+                Issue(
+                    type=ISSUE_TYPES.FLAKE8,
+                    file=m["file"],
+                    line=int(m["line"]),
+                    code=m["code"],
+                    message=m["msg"],
+                )
+                for line in proc.stdout
+                if (m := match(line.rstrip()))
+            ]
         return issues
@@ -1,14 +1,138 @@
-from .base_plugin import BasePlugin
+from .base_plugin import BasePlugin, Issue
 from constants import ISSUE_TYPES
-from radon.complexity import cc_visit
+from file_index import FileIndex
+from typing import Optional
+import ast
+import functools
+import hashlib
 import os
 import sys
 
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# Blocks above this cyclomatic complexity are reported
+COMPLEXITY_THRESHOLD = 10
+
+# Larger files are mostly generated or vendored code and are not analyzed
+MAX_FILE_SIZE = int(os.getenv("RADON_MAX_FILE_SIZE", 512 * 1024))
+# Package markers this small cannot hold a function worth reporting
+MIN_INIT_FILE_SIZE = 128
+
+# Complexity results are cached here by file content. Warm scanner containers
+# outlive a single scan, so unchanged files (vendored code, untouched modules)
+# are not parsed again on the next scan.
+CACHE_DIR = os.getenv("SCANNER_CACHE_DIR", "/tmp/scanner_cache")
+# Bump when CCVisitor changes how complexity is computed
+CACHE_VERSION = 1
+
+
+@functools.lru_cache(maxsize=1)
+def _result_cache():
+    """Opens the complexity cache, or returns None if it is unavailable."""
+    if diskcache is None:
+        return None
+    try:
+        return diskcache.Cache(os.path.join(CACHE_DIR, "radon"))
+    except Exception as e:
+        print(f"Radon result cache is disabled: {e}", file=sys.stderr)
+        return None
+
+
+class CCVisitor(ast.NodeVisitor):
+    """
+    Computes cyclomatic complexity with a single walk over a parsed module.
+
+    Decision points are counted the same way Radon's cc_visit counts them, and
+    the same blocks are reported: module-level functions and classes and the
+    methods of those classes. Closures and inner classes are scored on their
+    own and do not add to, or get reported next to, the enclosing block.
+    Results are collected as (name, lineno, complexity) tuples.
+    """
+
+    def __init__(self):
+        # Frames of the enclosing definitions: [name, lineno, complexity, methods]
+        # where methods is None for functions and a method count for classes
+        self.stack = []
+        self.results = []
+
+    def _add(self, amount: int):
+        if self.stack:
+            self.stack[-1][2] += amount
+
+    def _visit_block(self, node, is_class: bool):
+        self.stack.append([node.name, node.lineno, 1, 0 if is_class else None])
+        # Decorators, arguments and bases are not part of the block's complexity
+        for child in node.body:
+            self.visit(child)
+        name, lineno, complexity, methods = self.stack.pop()
+
+        parent = self.stack[-1] if self.stack else None
+        is_method = not is_class and parent is not None and parent[3] is not None
+        if is_method:
+            parent[2] += complexity
+            parent[3] += 1
+        if methods:
+            # Like Radon, a class is scored by the average complexity of its methods
+            complexity = complexity // methods + (methods > 1)
+        if parent is None or (is_method and len(self.stack) == 1):
+            self.results.append((name, lineno, complexity))
+
+    def visit_FunctionDef(self, node):
+        self._visit_block(node, False)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self._visit_block(node, True)
+
+    def visit_If(self, node):
+        self._add(1)
+        self.generic_visit(node)
+
+    visit_IfExp = visit_If
+
+    def visit_Assert(self, node):
+        # Radon does not look inside the asserted expression
+        self._add(1)
+
+    def visit_For(self, node):
+        self._add(1 + bool(node.orelse))
+        self.generic_visit(node)
+
+    visit_AsyncFor = visit_For
+    visit_While = visit_For
+
+    def visit_Try(self, node):
+        self._add(len(node.handlers) + bool(node.orelse))
+        self.generic_visit(node)
+
+    visit_TryStar = visit_Try
+
+    def visit_BoolOp(self, node):
+        self._add(len(node.values) - 1)
+        self.generic_visit(node)
+
+    def visit_comprehension(self, node):
+        self._add(1 + len(node.ifs))
+        self.generic_visit(node)
+
+    def visit_Match(self, node):
+        # A trailing wildcard case is the "else" branch and is not counted
+        has_wildcard = any(
+            isinstance(case.pattern, ast.MatchAs) and case.pattern.pattern is None
+            for case in node.cases
+        )
+        self._add(max(0, len(node.cases) - has_wildcard))
+        self.generic_visit(node)
+
 
 class RadonChecker(BasePlugin):
     """A plugin to analyze code complexity using Radon."""
 
-    def run(self, repo_path: str) -> list[dict]:
+    def run(self, repo_path: str, index: Optional[FileIndex] = None) -> list[Issue]:
         """
         Scans Python files for cyclomatic complexity.
         """
@@ -16,43 +140,75 @@ class RadonChecker(BasePlugin):
         issues = []
 
         try:
-            # Walk through all Python files in the repository
-            for root, _, files in os.walk(repo_path):
-                if ".git" in root:
+            if index is None:
+                index = FileIndex(repo_path)
+            skipped = 0
+            for filepath in index.python_files():
+                if self._should_skip(filepath, index):
+                    skipped += 1
                     continue
-                for file in files:
-                    if file.endswith(".py"):
-                        filepath = os.path.join(root, file)
-                        try:
-                            with open(filepath, "r", encoding="utf-8") as f:
-                                code = f.read()
-
-                            # Use cc_visit to get complexity results
-                            complexity_results = cc_visit(code)
-
-                            for result in complexity_results:
-                                if (
-                                    result.complexity > 10
-                                ):  # Only report functions with complexity > 10
-                                    issues.append(
-                                        {
-                                            "type": ISSUE_TYPES.RADON_COMPLEXITY,
-                                            "file": os.path.relpath(
-                                                filepath, repo_path
-                                            ),
-                                            "line": result.lineno,
-                                            "code": f"Complexity-{result.complexity}",
-                                            "message": f"{result.name} has a cyclomatic complexity of {result.complexity}",
-                                        }
-                                    )
-                        except Exception as e:
-                            # Ignore files that can't be read or parsed
-                            print(
-                                f"Radon could not analyze file {filepath}: {e}",
-                                file=sys.stderr,
-                            )
+                issues.extend(self._check_file(filepath, repo_path, index))
+            if skipped:
+                print(f"Radon skipped {skipped} files by size.")
         except Exception as e:
             print(f"An error occurred during Radon analysis: {e}", file=sys.stderr)
 
         print(f"Radon checker found {len(issues)} issues.")
         return issues
+
+    def _should_skip(self, filepath: str, index: FileIndex) -> bool:
+        """Whether a file is too large, or too small to be worth parsing."""
+        size = index.size(filepath) or 0
+        if size > MAX_FILE_SIZE:
+            return True
+        return size < MIN_INIT_FILE_SIZE and os.path.basename(filepath) == "__init__.py"
+
+    def _check_file(
+        self, filepath: str, repo_path: str, index: FileIndex
+    ) -> list[Issue]:
+        """Returns complexity issues for a single file."""
+        issues = []
+        try:
+            code = index.read(filepath)
+
+            for name, lineno, complexity in self._complexity(code, filepath):
+                if complexity > COMPLEXITY_THRESHOLD:
+                    issues.append(
+                        Issue(
+                            type=ISSUE_TYPES.RADON_COMPLEXITY,
+                            file=os.path.relpath(filepath, repo_path),
+                            line=lineno,
+                            code=f"Complexity-{complexity}",
+                            message=f"{name} has a cyclomatic complexity of {complexity}",
+                        )
+                    )
+        except Exception as e:
+            # Ignore files that can't be read or parsed
+            print(f"Radon could not analyze file {filepath}: {e}", file=sys.stderr)
+        return issues
+
+    def _complexity(self, code: bytes, filepath: str) -> list[tuple]:
+        """Returns the (name, lineno, complexity) of each block, cached by content."""
+        cache = _result_cache()
+        key = None
+        if cache is not None:
+            # Fresh clones reset mtimes, so the key is the content itself
+            key = f"{CACHE_VERSION}:{hashlib.blake2b(code, digest_size=20).hexdigest()}"
+            try:
+                results = cache.get(key)
+            except Exception:
+                results = None
+            if results is not None:
+                return results
+
+        # Parse once and walk the tree directly instead of going through cc_visit
+        tree = ast.parse(code, filename=filepath)
+        visitor = CCVisitor()
+        visitor.visit(tree)
+
+        if key is not None:
+            try:
+                cache.set(key, visitor.results)
+            except Exception as e:
+                print(f"Could not cache Radon results: {e}", file=sys.stderr)
+        return visitor.results
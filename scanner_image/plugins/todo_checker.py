@@ -1,67 +1,99 @@
-from .base_plugin import BasePlugin
+from .base_plugin import BasePlugin, Issue
 from constants import ISSUE_TYPES
+from file_index import FileIndex
+from typing import Optional
+import mmap
 import os
 import re
 import sys
 
+# Keywords the pattern looks for, used as a cheap check before running it
+TODO_KEYWORDS = (b"TODO:", b"FIXME:", b"XXX:")
+# Anchored at line starts, so lines without a keyword are tried once, not per byte
+TODO_RE = re.compile(rb"(?im)^.*(TODO|FIXME|XXX):(.*)$")
+# The keyword check upper-cases at most this much of a file at a time
+PREFILTER_CHUNK_SIZE = 1024 * 1024
+
+# Files the index did not cache are mapped instead of read once they reach this size
+MMAP_MIN_SIZE = 64 * 1024
+
+
+def _has_keyword(data) -> bool:
+    """
+    Whether a file's bytes or memory map may contain a to-do comment.
+
+    Upper-casing a chunk and searching it for each keyword is several times
+    faster than a case-insensitive regex search, which has no fast literal scan.
+    Chunks overlap so a keyword across a chunk boundary is still found.
+    """
+    overlap = max(map(len, TODO_KEYWORDS)) - 1
+    for start in range(0, len(data), PREFILTER_CHUNK_SIZE):
+        chunk = data[start : start + PREFILTER_CHUNK_SIZE + overlap].upper()
+        if any(keyword in chunk for keyword in TODO_KEYWORDS):
+            return True
+    return False
+
 
 class TodoChecker(BasePlugin):
     """
     A plugin to find TODO, FIXME, and XXX comments in the code.
     """
 
-    def run(self, repo_path: str) -> list[dict]:
+    def run(self, repo_path: str, index: Optional[FileIndex] = None) -> list[Issue]:
         """
         Scans all text-based files for common 'to-do' keywords.
         """
         print("Running TODO checker...")
+        if index is None:
+            index = FileIndex(repo_path)
         issues = []
-        todo_pattern = re.compile(r".*(TODO|FIXME|XXX):(.*)", re.IGNORECASE)
-
-        # Exclude common binary file extensions and large files
-        exclude_ext = {
-            ".png",
-            ".jpg",
-            ".jpeg",
-            ".gif",
-            ".zip",
-            ".tar",
-            ".gz",
-            ".ico",
-            ".pdf",
-            ".svg",
-        }
+        for filepath in index.text_files():
+            issues.extend(self._check_file(filepath, repo_path, index))
 
-        for root, _, files in os.walk(repo_path):
-            if ".git" in root:
-                continue
-            for file in files:
-                if any(file.endswith(ext) for ext in exclude_ext):
-                    continue
+        print(f"TODO checker found {len(issues)} issues.")
+        return issues
 
-                filepath = os.path.join(root, file)
+    def _check_file(
+        self, filepath: str, repo_path: str, index: FileIndex
+    ) -> list[Issue]:
+        """Returns the to-do comments found in a single file."""
+        try:
+            size = index.size(filepath) or 0
+            if index.is_cached(filepath) or size < MMAP_MIN_SIZE:
+                data = index.read(filepath)
+            else:
+                # Let the regex scan the page cache in place instead of a copy
+                with open(filepath, "rb") as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if not _has_keyword(mm):
+                            return []
+                        return self._find_todos(mm, filepath, repo_path)
+        except Exception as e:
+            print(f"TODO checker could not read file {filepath}: {e}", file=sys.stderr)
+            return []
 
-                try:
-                    with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                        for line_num, line in enumerate(f, 1):
-                            match = todo_pattern.match(line)
-                            if match:
-                                keyword = match.group(1).upper()
-                                message = match.group(2).strip()
-                                issues.append(
-                                    {
-                                        "type": ISSUE_TYPES.TODO_COMMENT,
-                                        "file": os.path.relpath(filepath, repo_path),
-                                        "line": line_num,
-                                        "code": f"FOUND_{keyword}",
-                                        "message": message,
-                                    }
-                                )
-                except Exception as e:
-                    print(
-                        f"TODO checker could not read file {filepath}: {e}",
-                        file=sys.stderr,
-                    )
+        # Most files have no to-do comments at all; skip the regex for them
+        if not _has_keyword(data):
+            return []
+        return self._find_todos(data, filepath, repo_path)
 
-        print(f"TODO checker found {len(issues)} issues.")
+    def _find_todos(self, data, filepath: str, repo_path: str) -> list[Issue]:
+        """Returns the to-do comments in a file's bytes or memory map."""
+        issues = []
+        line, counted_to = 1, 0
+        for match in TODO_RE.finditer(data):
+            # Count only the newlines since the previous match
+            line += data[counted_to : match.start()].count(b"\n")
+            counted_to = match.start()
+            keyword = match.group(1).decode("ascii").upper()
+            message = match.group(2).decode("utf-8", errors="replace").strip()
+            issues.append(
+                Issue(
+                    type=ISSUE_TYPES.TODO_COMMENT,
+                    file=os.path.relpath(filepath, repo_path),
+                    line=line,
+                    code=f"FOUND_{keyword}",
+                    message=message,
+                )
+            )
         return issues
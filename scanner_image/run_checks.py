@@ -1,19 +1,32 @@
-import json
+import contextlib
+import functools
 import sys
 import os
 import importlib
 import inspect
-from plugins.base_plugin import BasePlugin
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import orjson
+from typing import Optional
+from file_index import FileIndex
+from plugins.base_plugin import BasePlugin, Issue
 
+# Last line printed on stdout, followed by a tab and the number of issues
+RESULTS_SENTINEL = "__SCAN_DONE__"
 
-def discover_plugins() -> list[BasePlugin]:
-    """Dynamically discovers and instantiates all plugins in the 'plugins' directory."""
+# The scan's file index; plugin processes are forked and inherit it without pickling
+_file_index: Optional[FileIndex] = None
+
+
+@functools.lru_cache(maxsize=1)
+def _plugin_classes() -> tuple[type[BasePlugin], ...]:
+    """Imports the 'plugins' directory once and returns all plugin classes found."""
     plugin_dir = os.path.join(os.path.dirname(__file__), "plugins")
-    plugins = []
+    classes = []
     # Add plugin dir to path to allow imports
     sys.path.append(os.path.dirname(__file__))
 
-    for f in os.listdir(plugin_dir):
+    for f in sorted(os.listdir(plugin_dir)):
         if f.endswith(".py") and f != "base_plugin.py" and not f.startswith("__"):
             module_name = f"plugins.{f[:-3]}"
             try:
@@ -24,50 +37,98 @@ def discover_plugins() -> list[BasePlugin]:
                         and issubclass(obj, BasePlugin)
                         and obj is not BasePlugin
                     ):
-                        plugins.append(obj())  # Instantiate the plugin
+                        classes.append(obj)
                         print(f"Discovered plugin: {name}")
             except Exception as e:
                 print(
-                    f"Could not import or instantiate plugin from {f}: {e}",
+                    f"Could not import plugin module {f}: {e}",
                     file=sys.stderr,
                 )
+    return tuple(classes)
+
+
+def discover_plugins() -> list[BasePlugin]:
+    """Instantiates all plugins in the 'plugins' directory."""
+    plugins = []
+    for plugin_class in _plugin_classes():
+        try:
+            plugins.append(plugin_class())
+        except Exception as e:
+            print(
+                f"Could not instantiate plugin {plugin_class.__name__}: {e}",
+                file=sys.stderr,
+            )
     return plugins
 
 
-def main():
-    """Main function to run checks and write results."""
-    repo_path = "/repo"
-    output_path = "/output/results.json"
+def _run_plugin(plugin: BasePlugin, repo_path: str) -> list[Issue]:
+    """Runs one plugin in a worker process, with the index built by the parent."""
+    return plugin.run(repo_path, index=_file_index)
+
 
+def run_plugins(repo_path: str) -> list[Issue]:
+    """Discovers and runs all plugins, returning the combined issues."""
     print("Discovering plugins...")
     plugins_to_run = discover_plugins()
 
     if not plugins_to_run:
-        print("No plugins found. Exiting.", file=sys.stderr)
-        sys.exit(0)  # Exit gracefully if no plugins
+        print("No plugins found.", file=sys.stderr)
+        return []
 
     all_issues = []
     print(f"\nRunning checks on repository: {repo_path}")
 
-    for plugin in plugins_to_run:
-        plugin_name = plugin.__class__.__name__
-        try:
+    # Walk and read the repository once for all plugins
+    global _file_index
+    _file_index = FileIndex(repo_path)
+
+    # Plugins are independent, so each one runs in its own process
+    with ProcessPoolExecutor(
+        max_workers=len(plugins_to_run),
+        mp_context=multiprocessing.get_context("fork"),
+    ) as executor:
+        futures = {}
+        for plugin in plugins_to_run:
+            plugin_name = plugin.__class__.__name__
             print(f"--- Running plugin: {plugin_name} ---")
-            issues = plugin.run(repo_path)
-            if issues:
-                all_issues.extend(issues)
-            print(f"--- Finished plugin: {plugin_name} ---")
-        except Exception as e:
-            print(f"Error running plugin {plugin_name}: {e}", file=sys.stderr)
+            futures[plugin_name] = executor.submit(_run_plugin, plugin, repo_path)
+
+        # Collect in discovery order so the output is deterministic
+        for plugin_name, future in futures.items():
+            try:
+                issues = future.result()
+                if issues:
+                    all_issues.extend(issues)
+                print(f"--- Finished plugin: {plugin_name} ---")
+            except Exception as e:
+                print(f"Error running plugin {plugin_name}: {e}", file=sys.stderr)
 
     print(f"\nFound a total of {len(all_issues)} issues across all plugins.")
+    return all_issues
+
+
+def main():
+    """
+    Main function to run checks and stream the results.
+
+    Results are written to stdout as one JSON issue per line, followed by the
+    results sentinel. All progress output goes to stderr.
+
+    Usage: run_checks.py [repo_path]
+    """
+    repo_path = sys.argv[1] if len(sys.argv) > 1 else "/repo"
+
+    with contextlib.redirect_stdout(sys.stderr):
+        all_issues = run_plugins(repo_path)
 
     try:
-        with open(output_path, "w") as f:
-            json.dump(all_issues, f, indent=2)
-        print(f"Results written to {output_path}")
+        out = sys.stdout.buffer
+        for issue in all_issues:
+            out.write(orjson.dumps(issue, option=orjson.OPT_APPEND_NEWLINE))
+        out.write(f"{RESULTS_SENTINEL}\t{len(all_issues)}\n".encode())
+        out.flush()
     except IOError as e:
-        print(f"Error writing results to {output_path}: {e}", file=sys.stderr)
+        print(f"Error writing results to stdout: {e}", file=sys.stderr)
         sys.exit(1)
 
 
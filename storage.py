@@ -1,35 +1,76 @@
+import functools
+import io
 import os
-import json
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional
 import boto3
+import orjson
+from boto3.s3.transfer import TransferConfig
 from supabase import create_client
 
+from config.app_config import initialize_app
 from logging import getLogger
 
 logger = getLogger(__name__)
 
+# Maximum number of issue rows sent in a single insert request
+ISSUES_BATCH_SIZE = 500
+# Number of issue batches inserted concurrently
+ISSUES_INSERT_WORKERS = 4
+
+# Severity stored with each issue, keyed by the type names the scanner reports
+# (ISSUE_TYPES in scanner_image/constants.py)
+SEVERITY = {
+    "Flake8": "medium",
+    "Complexity": "high",
+    "Churn": "medium",
+    "TODO": "low",
+    "Coverage": "high",
+}
+
+# Large reports are uploaded to S3 in parallel multipart chunks
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024, max_concurrency=8
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _client():
+    """Creates the Supabase client once per process, or None without credentials."""
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_ANON_KEY")
+
+    if not supabase_url or not supabase_key:
+        logger.warning(
+            "Supabase credentials not found in environment variables. Storage will be disabled."
+        )
+        logger.debug(
+            "Missing environment variables: SUPABASE_URL and/or SUPABASE_ANON_KEY"
+        )
+        return None
+
+    client = create_client(supabase_url, supabase_key)
+    logger.info("Storage service initialized successfully")
+    return client
+
 
 class SupabaseStorageService:
     """Centralized storage service for all database operations."""
 
-    def __init__(self):
-        """Initialize storage service only once."""
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_ANON_KEY")
+    # S3 client shared by all instances, created on first upload
+    _s3_client = None
+    _s3_client_lock = threading.Lock()
 
-        if not supabase_url or not supabase_key:
-            logger.warning(
-                "Supabase credentials not found in environment variables. Storage will be disabled."
-            )
-            logger.debug(
-                "Missing environment variables: SUPABASE_URL and/or SUPABASE_ANON_KEY"
-            )
-            return
+    def __init__(self):
+        """Use the process-wide Supabase client."""
+        self.supabase = _client()
 
-        self.supabase = create_client(supabase_url, supabase_key)
-        logger.info("Storage service initialized successfully")
+    def is_available(self) -> bool:
+        """Whether a database connection is configured."""
+        return self.supabase is not None
 
     def store_scan_results(self, git_url: str, results: List[Dict]) -> Optional[str]:
         """
@@ -50,34 +91,29 @@ class SupabaseStorageService:
                 "status": "completed",
                 "total_issues": len(results),
                 "scanned_at": datetime.utcnow().isoformat(),
-                "report_json": json.dumps(results),
+                # Sent as a JSON value so the jsonb column is not a quoted string
+                "report_json": results,
             }
 
             # Upload the report to S3
-            self._upload_report_to_s3(scan_id, results)
+            self._upload_report_to_s3(scan_id, orjson.dumps(results))
 
             logger.debug(f"Inserting scan metadata for {scan_id}")
             self.supabase.table("scans").insert(scan_data).execute()
 
-            # Store individual issues for easier querying
-            if results:
-                issues_data = []
-                for issue in results:
-                    issue_data = {
-                        "scan_id": scan_id,
-                        "type": issue.get("type"),
-                        "file_path": issue.get("file"),
-                        "line_number": issue.get("line"),
-                        "code": issue.get("code"),
-                        "message": issue.get("message"),
-                        "severity": self._determine_severity(issue.get("type")),
-                    }
-                    issues_data.append(issue_data)
-
-                logger.debug(
-                    f"Inserting {len(issues_data)} individual issues for scan {scan_id}"
+            # Store individual issues for easier querying, in concurrent batches
+            batches = [
+                results[start : start + ISSUES_BATCH_SIZE]
+                for start in range(0, len(results), ISSUES_BATCH_SIZE)
+            ]
+            with ThreadPoolExecutor(max_workers=ISSUES_INSERT_WORKERS) as executor:
+                # Consume the results so a failed insert raises here
+                list(
+                    executor.map(
+                        lambda batch: self.store_scan_results_batch(scan_id, batch),
+                        batches,
+                    )
                 )
-                self.supabase.table("issues").insert(issues_data).execute()
 
             logger.info(f"Successfully stored scan results with ID: {scan_id}")
             return scan_id
@@ -90,14 +126,47 @@ class SupabaseStorageService:
             self._store_failed_scan_record(scan_id, git_url, str(e))
             return None
 
-    def _upload_report_to_s3(self, scan_id: str, results: List[Dict]):
-        """Upload the report to S3."""
+    def store_scan_results_batch(self, scan_id: str, issues: List[Dict]):
+        """Store a batch of issues for an existing scan with a single insert."""
+        if not issues:
+            return
+
+        severity = SEVERITY.get
+        issues_data = [
+            {
+                "scan_id": scan_id,
+                "type": issue.get("type"),
+                "file_path": issue.get("file"),
+                "line_number": issue.get("line"),
+                "code": issue.get("code"),
+                "message": issue.get("message"),
+                "severity": severity(issue.get("type"), "medium"),
+            }
+            for issue in issues
+        ]
+
+        logger.debug(
+            f"Inserting {len(issues_data)} individual issues for scan {scan_id}"
+        )
+        self.supabase.table("issues").insert(issues_data).execute()
+
+    @classmethod
+    def _get_s3_client(cls):
+        """Return the shared S3 client, creating it on first use."""
+        with cls._s3_client_lock:
+            if cls._s3_client is None:
+                cls._s3_client = boto3.client("s3")
+            return cls._s3_client
+
+    def _upload_report_to_s3(self, scan_id: str, report: bytes):
+        """Upload the JSON-encoded report to S3."""
         try:
             logger.debug(f"Uploading report to S3: {scan_id}")
-            s3 = boto3.resource("s3")
             bucket_name = os.getenv("S3_BUCKET_NAME")
             key = f"scans/{scan_id}.json"
-            s3.Bucket(bucket_name).put_object(Key=key, Body=json.dumps(results))
+            self._get_s3_client().upload_fileobj(
+                io.BytesIO(report), bucket_name, key, Config=S3_TRANSFER_CONFIG
+            )
             logger.info(f"Uploaded report to S3: s3://{bucket_name}/{key}")
             return True
         except Exception as e:
@@ -139,15 +208,7 @@ class SupabaseStorageService:
             )
             return None
 
-    def _determine_severity(self, issue_type: str) -> str:
-        """Determine severity based on issue type."""
-        severity_map = {
-            "flake8": "medium",
-            "radon_complexity": "high",
-            "git_churn": "medium",
-            "todo_comment": "low",
-            "coverage": "high",
-        }
-        severity = severity_map.get(issue_type, "medium")
-        logger.debug(f"Determined severity '{severity}' for issue type '{issue_type}'")
-        return severity
+
+# Shared instance; the environment must be loaded before it is created
+initialize_app()
+storage_service = SupabaseStorageService()